@@ -1,19 +1,24 @@
+from typing import NamedTuple, Tuple, Union
 
-from pydantic import BaseModel
 
+# Landmarks are identified by a string, or a tuple of strings such as the (SSID, MAC address) of a WiFi network
+Identifier = Union[str, Tuple[str, ...]]
 
-class CartesianLandmark(BaseModel):
+
+class CartesianLandmark(NamedTuple):
     """ Data model for Cartesian landmark data """
-    identifier: str
+    identifier: Identifier
     x_m: float
     y_m: float
     z_m: float
     uncertainty_m: float
 
+    position_fields = ("x_m", "y_m", "z_m")
+
 
-class GeodeticLandmark(BaseModel):
+class GeodeticLandmark(NamedTuple):
     """ Data model for geodetic landmark data """
-    identifier: str
+    identifier: Identifier
     latitude_deg: float
     longitude_deg: float
     altitude_m: float
@@ -21,3 +26,4 @@ class GeodeticLandmark(BaseModel):
     longitude_uncertainty_deg: float
     altitude_uncertainty_m: float
 
+    position_fields = ("latitude_deg", "longitude_deg", "altitude_m")
@@ -1,60 +1,283 @@
-import json
-from typing import Dict, Tuple
+import math
+from array import array
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Type
 from pathlib import Path
 
-from pydantic import BaseModel
+import numpy as np
+import orjson
+
+from locomapper.data_models import Identifier
+
+
+# Separator used to flatten tuple identifiers into json object keys
+IDENTIFIER_SEPARATOR = "\x1f"
+
+# Number of identifiers the running sum arrays are allocated for before they first grow
+INITIAL_CAPACITY = 64
+
+
+def _encode_identifier(identifier: Identifier) -> str:
+    """ Encode an identifier as a string so it can be used as a json key. Tuple identifiers are
+    prefixed with the separator so they can never be confused with a string identifier."""
+    parts = identifier if isinstance(identifier, tuple) else (identifier,)
+    if len(parts) == 0 or not all(isinstance(part, str) for part in parts):
+        raise TypeError(f"Identifiers must be a str or a non-empty tuple of str, got {identifier!r}")
+    if any(IDENTIFIER_SEPARATOR in part for part in parts):
+        raise ValueError(f"Identifiers must not contain {IDENTIFIER_SEPARATOR!r}, got {identifier!r}")
+    if isinstance(identifier, tuple):
+        return IDENTIFIER_SEPARATOR + IDENTIFIER_SEPARATOR.join(identifier)
+    return identifier
+
+
+def _decode_identifier(key: str) -> Identifier:
+    """ Decode a json key produced by _encode_identifier back into an identifier."""
+    if key.startswith(IDENTIFIER_SEPARATOR):
+        return tuple(key[len(IDENTIFIER_SEPARATOR):].split(IDENTIFIER_SEPARATOR))
+    return key
 
 
 class LandmarkStore:
-    """ Store for landmark data. """
-    def __init__(self, data_model: BaseModel):
-        """ Initialize the LandmarkStore with a data model."""
-        self.data_model: BaseModel = data_model
-        self._storage: Dict[int, Tuple[BaseModel, ...]] = {}
+    """ Store for landmark data. Each identifier's data is stored column-wise, one array of
+    floats per data model field, rather than as a tuple of data model instances. Running
+    sums of the data model's position fields are kept alongside the data, one row per
+    identifier, so that the mean position of any number of identifiers can be gathered
+    with a single array operation. Single puts accumulate into plain Python floats, which
+    are only added into the arrays when a mean is next read, as per-put numpy updates
+    would cost more than the rest of the put."""
+    def __init__(self, data_model: Type[NamedTuple], log_file: Optional[str] = None):
+        """ Initialize the LandmarkStore with a data model. If a log file is given every datum
+        put into the store is also appended to it, see save_append and load_ndjson."""
+        self.data_model: Type[NamedTuple] = data_model
+        self.log_file: Optional[str] = log_file
+        # Data models have the identifier as their first field, every other field is a float
+        self._value_fields: Tuple[str, ...] = data_model._fields[1:]
+        self._position_indices: Tuple[int, ...] = tuple(
+            self._value_fields.index(field) for field in data_model.position_fields
+        )
+        self._columns: Dict[Identifier, Tuple[array, ...]] = {}
+        self._rows: Dict[Identifier, int] = {}
+        self._sums = np.zeros((INITIAL_CAPACITY, len(data_model.position_fields)))
+        self._counts = np.zeros(INITIAL_CAPACITY, dtype=np.int64)
+        # Sums of single puts not yet added to the arrays, the position field sums then the count
+        self._pending: Dict[int, List[float]] = {}
 
-    def get(self, identifier: str) -> Tuple[BaseModel, ...]:
+    def get(self, identifier: Identifier) -> Tuple[NamedTuple, ...]:
         """ Get the data for a given identifier."""
-        return self._storage.get(identifier, ())
+        columns = self._columns.get(identifier)
+        if columns is None:
+            return ()
+        return tuple(self.data_model(identifier, *values) for values in zip(*columns))
+
+    def _add_row(self, identifier: Identifier) -> int:
+        """ Allocate a running sum row for a new identifier, growing the arrays if needed."""
+        row = len(self._rows)
+        if row == len(self._counts):
+            sums = np.zeros((2 * row, self._sums.shape[1]))
+            sums[:row] = self._sums
+            counts = np.zeros(2 * row, dtype=np.int64)
+            counts[:row] = self._counts
+            self._sums = sums
+            self._counts = counts
+        self._rows[identifier] = row
+        return row
+
+    def _columns_for(self, identifier: Identifier) -> Tuple[int, Tuple[array, ...]]:
+        """ Get the running sum row and columns of an identifier, creating them if needed."""
+        row = self._rows.get(identifier)
+        if row is not None:
+            return row, self._columns[identifier]
+        # Check the identifier can be saved before it is added
+        _encode_identifier(identifier)
+        row = self._add_row(identifier)
+        columns = tuple(array("d") for _ in self._value_fields)
+        self._columns[identifier] = columns
+        return row, columns
 
-    def put(self, datum: BaseModel) -> bool:
+    def _check_values(self, values: Sequence[float]) -> Tuple[float, ...]:
+        """ Convert the values for one datum to floats, raising before anything in the store
+        is changed if there are the wrong number of them or they are not finite numbers.
+        Non-finite values are rejected as json cannot represent them."""
+        if len(values) != len(self._value_fields):
+            raise ValueError(
+                f"Expected {len(self._value_fields)} values ({', '.join(self._value_fields)}), got {len(values)}"
+            )
+        values = tuple(float(value) for value in values)
+        if not all(math.isfinite(value) for value in values):
+            raise ValueError(f"Values must be finite, got {values}")
+        return values
+
+    def put(self, datum: NamedTuple) -> bool:
         """ Put the data into the store."""
-        identifier = datum.identifier
-        found_data_flag = False
-        if identifier in self._storage:
-            existing_data = self._storage[identifier]
-            self._storage[identifier] = existing_data + (datum,)
-            found_data_flag = True
-        else:
-            self._storage[identifier] = (datum,)
+        return self.put_values(datum.identifier, datum[1:])
+
+    def put_values(self, identifier: Identifier, values: Sequence[float]) -> bool:
+        """ Put data into the store without building a data model instance, values are
+        given in the order of the data model's fields after the identifier."""
+        values = self._check_values(values)
+        found_data_flag = identifier in self._rows
+        row, columns = self._columns_for(identifier)
+        for column, value in zip(columns, values):
+            column.append(value)
+        pending = self._pending.get(row)
+        if pending is None:
+            pending = self._pending[row] = [0.0] * (len(self._position_indices) + 1)
+        for pending_index, value_index in enumerate(self._position_indices):
+            pending[pending_index] += values[value_index]
+        pending[-1] += 1
+        if self.log_file is not None:
+            self.save_append(self.log_file, self.data_model(identifier, *values))
         return found_data_flag
 
+    def put_many(self, identifiers: Sequence[Identifier], values: Sequence) -> List[bool]:
+        """ Put data for many identifiers into the store at once. Values are either a single
+        sequence of values shared by every identifier, or one sequence of values per identifier,
+        in the order of the data model's fields after the identifier. Returns whether data was
+        already stored for each identifier, as put does."""
+        values = np.asarray(values, dtype=float)
+        if values.ndim == 0 or values.shape[-1] != len(self._value_fields):
+            raise ValueError(
+                f"Expected {len(self._value_fields)} values ({', '.join(self._value_fields)}) per identifier"
+            )
+        if not np.isfinite(values).all():
+            raise ValueError("Values must be finite")
+        values = np.broadcast_to(values, (len(identifiers), len(self._value_fields)))
+        for identifier in identifiers:
+            if identifier not in self._rows:
+                _encode_identifier(identifier)
+        rows = np.empty(len(identifiers), dtype=np.int64)
+        found_data_flags = []
+        values_list = values.tolist()
+        for index, (identifier, identifier_values) in enumerate(zip(identifiers, values_list)):
+            found_data_flags.append(identifier in self._rows)
+            row, columns = self._columns_for(identifier)
+            for column, value in zip(columns, identifier_values):
+                column.append(value)
+            rows[index] = row
+        # np.add.at accumulates correctly when an identifier appears more than once
+        np.add.at(self._sums, rows, values[:, self._position_indices])
+        np.add.at(self._counts, rows, 1)
+        if self.log_file is not None:
+            self.save_append_many(
+                self.log_file,
+                [self.data_model(identifier, *identifier_values)
+                 for identifier, identifier_values in zip(identifiers, values_list)]
+            )
+        return found_data_flags
+
+    def _flush(self):
+        """ Add the sums of single puts into the running sum arrays."""
+        if not self._pending:
+            return
+        rows = list(self._pending)
+        pending = np.array(list(self._pending.values()))
+        # Each row appears once so plain fancy indexing accumulates correctly
+        self._sums[rows] += pending[:, :-1]
+        self._counts[rows] += pending[:, -1].astype(np.int64)
+        self._pending = {}
+
+    def mean(self, identifier: Identifier) -> Optional[Tuple[float, ...]]:
+        """ Get the mean of the position fields for a given identifier, None if there is no data."""
+        row = self._rows.get(identifier)
+        if row is None:
+            return None
+        self._flush()
+        return tuple((self._sums[row] / self._counts[row]).tolist())
+
+    def means(self, identifiers: Iterable[Identifier]) -> np.ndarray:
+        """ Get the mean of the position fields for each identifier that has data, one row
+        per identifier. Identifiers without data are skipped."""
+        self._flush()
+        rows = [self._rows.get(identifier) for identifier in identifiers]
+        rows = [row for row in rows if row is not None]
+        return self._sums[rows] / self._counts[rows, None]
+
     def __len__(self) -> int:
         """ Return the number of elements in the store."""
-        return len(self._storage)
+        return len(self._columns)
 
     def save(self, save_file: str):
         """ Save the store to a json file."""
         save_path = Path(save_file).absolute()
         save_path.parent.mkdir(parents=True, exist_ok=True)
 
-        # Convert each tuple of BaseModels into a list of dicts
+        # Convert the data of each identifier into a list of dicts
         serializable_data = {
-            str(identifier): [model.dict() for model in models_tuple]
-            for identifier, models_tuple in self._storage.items()
+            _encode_identifier(identifier): [model._asdict() for model in self.get(identifier)]
+            for identifier in self._columns
         }
 
-        with open(save_path, "w", encoding="utf-8") as file:
-            json.dump(serializable_data, file, indent=2)
+        with open(save_path, "wb") as file:
+            file.write(orjson.dumps(serializable_data, option=orjson.OPT_INDENT_2))
 
     def load(self, load_file: str) -> int:
         """ Load the store from a json file. Returns the number of identifiers loaded."""
         load_path = Path(load_file).absolute()
-        with open(load_path, "r", encoding="utf-8") as file:
-            raw_data = json.load(file)
+        with open(load_path, "rb") as file:
+            raw_data = orjson.loads(file.read())
 
-        # Rebuild the dictionary of tuples of BaseModels
-        self._storage = {
-            identifier: tuple(self.data_model(**model_dict) for model_dict in models_list)
-            for identifier, models_list in raw_data.items()
-        }
-        return len(self._storage)
+        # Rebuild the store from the saved values directly, without building data model
+        # instances. The identifier is taken from the decoded key as json turns tuple
+        # identifiers into lists. The new store is only swapped in once every record has
+        # been put, so a bad file leaves the current data untouched
+        store = LandmarkStore(self.data_model)
+        for key, models_list in raw_data.items():
+            identifier = _decode_identifier(key)
+            for model_dict in models_list:
+                store.put_values(identifier, [model_dict[field] for field in self._value_fields])
+        store._flush()
+        self._columns = store._columns
+        self._rows = store._rows
+        self._sums = store._sums
+        self._counts = store._counts
+        self._pending = {}
+        return len(self._columns)
+
+    def save_append(self, save_file: str, datum: NamedTuple):
+        """ Append a single datum to a newline delimited json file, one record per line.
+        Unlike save this only writes the new datum, so it is cheap to call on every put."""
+        self.save_append_many(save_file, (datum,))
+
+    def save_append_many(self, save_file: str, data: Iterable[NamedTuple]):
+        """ Append many data to a newline delimited json file, one record per line."""
+        save_path = Path(save_file).absolute()
+        save_path.parent.mkdir(parents=True, exist_ok=True)
+
+        lines = [
+            orjson.dumps({**datum._asdict(), "identifier": _encode_identifier(datum.identifier)}) + b"\n"
+            for datum in data
+        ]
+        with open(save_path, "ab") as file:
+            file.write(b"".join(lines))
+
+    def load_ndjson(self, load_file: str) -> int:
+        """ Put every record of a newline delimited json file written by save_append into the
+        store, on top of any data already stored. Returns the number of records loaded."""
+        load_path = Path(load_file).absolute()
+        # Put every record into a scratch store first and only merge it in once they have all
+        # been put, so a bad file leaves the store untouched
+        store = LandmarkStore(self.data_model)
+        n_records = 0
+        with open(load_path, "rb") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                record = orjson.loads(line)
+                identifier = _decode_identifier(record["identifier"])
+                store.put_values(identifier, [record[field] for field in self._value_fields])
+                n_records += 1
+        self._merge(store)
+        return n_records
+
+    def _merge(self, store: "LandmarkStore"):
+        """ Add all of the data of another store with the same data model to this store."""
+        store._flush()
+        rows = []
+        for identifier, other_columns in store._columns.items():
+            row, columns = self._columns_for(identifier)
+            for column, other_column in zip(columns, other_columns):
+                column.extend(other_column)
+            rows.append(row)
+        other_rows = [store._rows[identifier] for identifier in store._columns]
+        # Each identifier appears once so its row only appears once
+        self._sums[rows] += store._sums[other_rows]
+        self._counts[rows] += store._counts[other_rows]
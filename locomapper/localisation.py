@@ -1,19 +1,23 @@
 
-from typing import Tuple, Optional
+from typing import Dict, Iterable, Sequence, Tuple, Optional
+
+import numpy as np
 
 from locomapper.landmark_store import LandmarkStore
-from locomapper.data_models import GeodeticLandmark, CartesianLandmark
+from locomapper.data_models import GeodeticLandmark, CartesianLandmark, Identifier
 
 
 class GlobalLocalisation:
     """Class to store and localise (at a global scale) based on data.
     """
-    def __init__(self):
-        """Initialise the GlobalLocalisation class."""
-        self._store = LandmarkStore(GeodeticLandmark)
+    def __init__(self, log_file: Optional[str] = None):
+        """Initialise the GlobalLocalisation class. If a log file is given every piece of
+        data added is also appended to it, see load_log."""
+        self._store = LandmarkStore(GeodeticLandmark, log_file=log_file)
+        self._localise_cache: Dict[Identifier, GeodeticLandmark] = {}
 
     def add_data(self, 
-        identifier: str, 
+        identifier: Identifier, 
         latitude_deg: float, 
         longitude_deg: float, 
         altitude_m: float,
@@ -22,42 +26,62 @@ class GlobalLocalisation:
         altitude_uncertainty_m: float = 10.0
     ):
         """Add data to the store."""
-        landmark = GeodeticLandmark(
-            identifier=identifier, 
-            latitude_deg=latitude_deg, 
-            longitude_deg=longitude_deg, 
-            altitude_m=altitude_m,
-            latitude_uncertainty_deg=latitude_uncertainty_deg,
-            longitude_uncertainty_deg=longitude_uncertainty_deg,
-            altitude_uncertainty_m=altitude_uncertainty_m
-        )
-        self._store.put(landmark)
-
-    def get_data(self, identifier: str) -> Tuple[GeodeticLandmark]:
+        # Invalidate before the store writes its log so a failed write cannot leave a stale cache entry
+        self._localise_cache.pop(identifier, None)
+        self._store.put_values(identifier, (
+            latitude_deg,
+            longitude_deg,
+            altitude_m,
+            latitude_uncertainty_deg,
+            longitude_uncertainty_deg,
+            altitude_uncertainty_m
+        ))
+
+    def add_many(self,
+        identifiers: Sequence[Identifier],
+        latitude_deg: float,
+        longitude_deg: float,
+        altitude_m: float,
+        latitude_uncertainty_deg: float = 1e-6,
+        longitude_uncertainty_deg: float = 1e-6,
+        altitude_uncertainty_m: float = 10.0
+    ):
+        """Add data for many identifiers observed at the same location to the store."""
+        # Invalidate before the store writes its log so a failed write cannot leave stale cache entries
+        for identifier in identifiers:
+            self._localise_cache.pop(identifier, None)
+        self._store.put_many(identifiers, (
+            latitude_deg,
+            longitude_deg,
+            altitude_m,
+            latitude_uncertainty_deg,
+            longitude_uncertainty_deg,
+            altitude_uncertainty_m
+        ))
+
+    def get_data(self, identifier: Identifier) -> Tuple[GeodeticLandmark]:
         """Get data from the store."""
         return self._store.get(identifier)
+
+    def get_means(self, identifiers: Iterable[Identifier]) -> np.ndarray:
+        """Get the mean latitude, longitude and altitude of each identifier with data, one row per identifier."""
+        return self._store.means(identifiers)
         
     def __len__(self) -> int:
         """Return the number of elements in the store."""
         return len(self._store)
 
-    def localise(self, identifier: str) -> Optional[GeodeticLandmark]:
-        """Localise based on data."""
-        landmark_tuple = self.get_data(identifier)
-        if len(landmark_tuple) == 0:
+    def localise(self, identifier: Identifier) -> Optional[GeodeticLandmark]:
+        """Localise based on data. Results are cached until new data is added for the identifier."""
+        cached_landmark = self._localise_cache.get(identifier)
+        if cached_landmark is not None:
+            return cached_landmark
+        mean = self._store.mean(identifier)
+        if mean is None:
             return None
         # Average the data, this is probably not a great way to do this, but it works
-        latitude_deg = 0.0
-        longitude_deg = 0.0
-        altitude_m = 0.0
-        for landmark in landmark_tuple:
-            latitude_deg += landmark.latitude_deg
-            longitude_deg += landmark.longitude_deg
-            altitude_m += landmark.altitude_m
-        latitude_deg /= len(landmark_tuple)
-        longitude_deg /= len(landmark_tuple)
-        altitude_m /= len(landmark_tuple)
-        return GeodeticLandmark(
+        latitude_deg, longitude_deg, altitude_m = mean
+        landmark = GeodeticLandmark(
             identifier=identifier,
             latitude_deg=latitude_deg,
             longitude_deg=longitude_deg,
@@ -66,6 +90,8 @@ class GlobalLocalisation:
             longitude_uncertainty_deg=1e-6,
             altitude_uncertainty_m=10.0
         )
+        self._localise_cache[identifier] = landmark
+        return landmark
 
     def save(self, filename: str):
         """Save the store to a file."""
@@ -74,33 +100,35 @@ class GlobalLocalisation:
     def load(self, filename: str):
         """Load the store from a file."""
         self._store.load(filename)
+        self._localise_cache.clear()
+
+    def load_log(self, filename: str):
+        """Add the data from a log file written via log_file to the store."""
+        try:
+            self._store.load_ndjson(filename)
+        finally:
+            self._localise_cache.clear()
 
 
 class CartesianLocalisation:
     """Class to store and localise (in a cartesian frame) based on data.
     """
-    def __init__(self):
-        """Initialise the CartesianLocalisation class."""
-        self._store = LandmarkStore(CartesianLandmark)
+    def __init__(self, log_file: Optional[str] = None):
+        """Initialise the CartesianLocalisation class. If a log file is given every piece of
+        data added is also appended to it, see load_log."""
+        self._store = LandmarkStore(CartesianLandmark, log_file=log_file)
 
     def add_data(self, 
-        identifier: str, 
+        identifier: Identifier, 
         x_m: float, 
         y_m: float, 
         z_m: float,
         uncertainty_m: float = 0.1
     ):
         """Add data to the store."""
-        landmark = CartesianLandmark(
-            identifier=identifier, 
-            x_m=x_m, 
-            y_m=y_m, 
-            z_m=z_m,
-            uncertainty_m=uncertainty_m
-        )
-        self._store.put(landmark)
+        self._store.put_values(identifier, (x_m, y_m, z_m, uncertainty_m))
 
-    def get_data(self, identifier: str) -> Tuple[CartesianLandmark]:
+    def get_data(self, identifier: Identifier) -> Tuple[CartesianLandmark]:
         """Get data from the store."""
         return self._store.get(identifier)
         
@@ -108,22 +136,13 @@ class CartesianLocalisation:
         """Return the number of elements in the store."""
         return len(self._store)
 
-    def localise(self, identifier: str) -> Optional[CartesianLandmark]:
+    def localise(self, identifier: Identifier) -> Optional[CartesianLandmark]:
         """Localise based on data."""
-        landmark_tuple = self.get_data(identifier)
-        if len(landmark_tuple) == 0:
+        mean = self._store.mean(identifier)
+        if mean is None:
             return None
         # Average the data, this is probably not a great way to do this, but it works
-        x_m = 0.0
-        y_m = 0.0
-        z_m = 0.0
-        for landmark in landmark_tuple:
-            x_m += landmark.x_m
-            y_m += landmark.y_m
-            z_m += landmark.z_m
-        x_m /= len(landmark_tuple)
-        y_m /= len(landmark_tuple)
-        z_m /= len(landmark_tuple)
+        x_m, y_m, z_m = mean
         return CartesianLandmark(
             identifier=identifier,
             x_m=x_m,
@@ -138,4 +157,8 @@ class CartesianLocalisation:
 
     def load(self, filename: str):
         """Load the store from a file."""
-        self._store.load(filename)
\ No newline at end of file
+        self._store.load(filename)
+
+    def load_log(self, filename: str):
+        """Add the data from a log file written via log_file to the store."""
+        self._store.load_ndjson(filename)
\ No newline at end of file
@@ -0,0 +1,79 @@
+"""
+WiFi based global localisation, landmarks are identified by the (SSID, MAC address) of a WiFi network.
+
+Scanning uses the optional nmcli library:
+```
+pip install nmcli
+```
+"""
+
+import math
+import time
+from typing import Tuple, List, Optional
+
+from locomapper.localisation import GlobalLocalisation
+from locomapper.data_models import GeodeticLandmark
+
+
+# A WiFi scan takes a few seconds to complete, so results younger than this are reused
+SCAN_TTL_S = 3.0
+
+_scan_cache = {"time_s": -math.inf, "wifi_data": []}
+
+
+def scan_wifi(ttl_s: float = SCAN_TTL_S) -> List:
+    """Scan for WiFi networks. Results are reused for ttl_s seconds to avoid
+    spawning nmcli when no new scan could have completed."""
+    now_s = time.monotonic()
+    if now_s - _scan_cache["time_s"] < ttl_s:
+        return _scan_cache["wifi_data"]
+
+    import nmcli
+
+    try:
+        nmcli.device.wifi_rescan()
+    except Exception as e:
+        pass
+    wifi_data = nmcli.device.wifi()
+    _scan_cache["time_s"] = now_s
+    _scan_cache["wifi_data"] = wifi_data
+    return wifi_data
+
+
+def get_wifi_data() -> List[Tuple[str, str]]:
+    """Get a list of the SSID and MAC addresses of the WiFi networks in the vicinity."""
+    wifi_data = scan_wifi()
+    return [(wifi.ssid, wifi.bssid) for wifi in wifi_data]
+
+
+class WifiGlobalLocalisation(GlobalLocalisation):
+    """Class to store and localise (at a global scale) based on WiFi networks.
+    """
+    def add_wifi_data(self, ssid: str, mac: str, latitude_deg: float, longitude_deg: float, altitude_m: float):
+        """Add WiFi data to the store."""
+        identifier = (ssid, mac)
+        self.add_data(identifier, latitude_deg, longitude_deg, altitude_m)
+
+    def add_wifi_batch(self, wifi_tuple: Tuple[Tuple[str, str]], latitude_deg: float, longitude_deg: float, altitude_m: float):
+        """Add data for many WiFi networks observed at the same location to the store."""
+        identifiers = [(ssid, mac) for ssid, mac in wifi_tuple]
+        self.add_many(identifiers, latitude_deg, longitude_deg, altitude_m)
+
+    def get_wifi_data(self, ssid: str, mac: str) -> Tuple[GeodeticLandmark]:
+        """Get WiFi data from the store."""
+        identifier = (ssid, mac)
+        return self.get_data(identifier)
+
+    def localise_wifi(self, ssid: str, mac: str) -> Optional[GeodeticLandmark]:
+        """Localise based on a single WiFi network."""
+        identifier = (ssid, mac)
+        return self.localise(identifier)
+
+    def localise_multiple(self, wifi_tuple: Tuple[Tuple[str, str]]) -> Optional[Tuple[float, float, float]]:
+        """Localise based on multiple WiFi networks, averaging over the networks with data.
+        Returns None if none of the networks have data."""
+        means = self.get_means((ssid, mac) for ssid, mac in wifi_tuple)
+        if len(means) == 0:
+            return None
+        latitude_deg, longitude_deg, altitude_m = means.mean(axis=0).tolist()
+        return latitude_deg, longitude_deg, altitude_m
@@ -15,7 +15,8 @@ setup(
     url='https://github.com/hugohadfield/locomapper',
     packages=find_packages(),
     install_requires=[
-        'pydantic',
+        'numpy',
+        'orjson',
     ],
     classifiers=[
         'Programming Language :: Python :: 3',